@@ -92,6 +92,44 @@ logger = logging.getLogger(__name__)
     type=int,
     help="Minimum number of messages per topic+partition librdkafka tries to maintain in the local consumer queue.",
 )
+@click.option(
+    "--fetch-min-bytes",
+    default=settings.DEFAULT_FETCH_MIN_BYTES,
+    type=int,
+    help="Minimum number of bytes the broker should accumulate before answering a fetch request.",
+)
+@click.option(
+    "--fetch-wait-max-ms",
+    default=settings.DEFAULT_FETCH_WAIT_MAX_MS,
+    type=int,
+    help="Maximum time the broker may wait to fill a fetch response up to --fetch-min-bytes.",
+)
+@click.option(
+    "--fetch-message-max-bytes",
+    type=int,
+    help="Initial maximum number of bytes per topic+partition to request when fetching messages.",
+)
+@click.option(
+    "--producer-compression-type",
+    type=click.Choice(["none", "gzip", "snappy", "lz4", "zstd"]),
+    help="Compression codec used when producing replacements and commit log messages. Defaults to lz4.",
+)
+@click.option(
+    "--producer-linger-ms",
+    type=int,
+    help="Time to wait for messages to accumulate before sending a produce request. Defaults to 50.",
+)
+@click.option(
+    "--producer-batch-num-messages",
+    type=int,
+    help="Maximum number of messages batched in one produce request. Defaults to 10000.",
+)
+@click.option(
+    "--cooperative-rebalance",
+    is_flag=True,
+    default=False,
+    help="Use the cooperative-sticky partition assignment strategy. All consumers in the group must be switched together.",
+)
 @click.option("--log-level", help="Logging level to use.")
 @click.option(
     "--processes",
@@ -124,6 +162,13 @@ def consumer(
     no_strict_offset_reset: bool,
     queued_max_messages_kbytes: int,
     queued_min_messages: int,
+    fetch_min_bytes: int,
+    fetch_wait_max_ms: int,
+    fetch_message_max_bytes: Optional[int],
+    producer_compression_type: Optional[str],
+    producer_linger_ms: Optional[int],
+    producer_batch_num_messages: Optional[int],
+    cooperative_rebalance: bool,
     processes: Optional[int],
     input_block_size: Optional[int],
     output_block_size: Optional[int],
@@ -151,6 +196,18 @@ def consumer(
     def stats_callback(stats_json: str) -> None:
         stats = rapidjson.loads(stats_json)
         metrics.gauge("librdkafka.total_queue_size", stats.get("replyq", 0))
+        metrics.gauge("librdkafka.total_rx_messages", stats.get("rxmsgs", 0))
+
+        # Messages fetched from the brokers and waiting in the local consumer
+        # queue, summed across partitions. When this reaches the queued
+        # limits librdkafka backs off fetching.
+        fetch_queue_count = 0
+        for topic_stats in stats.get("topics", {}).values():
+            for partition, partition_stats in topic_stats.get("partitions", {}).items():
+                # -1 is the internal unassigned partition
+                if partition != "-1":
+                    fetch_queue_count += partition_stats.get("fetchq_cnt", 0)
+        metrics.gauge("librdkafka.total_fetch_queue_count", fetch_queue_count)
 
     consumer_builder = ConsumerBuilder(
         storage_key=storage_key,
@@ -164,6 +221,13 @@ def consumer(
             strict_offset_reset=not no_strict_offset_reset,
             queued_max_messages_kbytes=queued_max_messages_kbytes,
             queued_min_messages=queued_min_messages,
+            fetch_min_bytes=fetch_min_bytes,
+            fetch_wait_max_ms=fetch_wait_max_ms,
+            fetch_message_max_bytes=fetch_message_max_bytes,
+            producer_compression_type=producer_compression_type,
+            producer_linger_ms=producer_linger_ms,
+            producer_batch_num_messages=producer_batch_num_messages,
+            cooperative_rebalance=cooperative_rebalance,
         ),
         processing_params=ProcessingParameters(
             processes=processes,
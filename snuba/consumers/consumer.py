@@ -585,6 +585,39 @@ def process_message(
         return result
 
 
+class ProcessMessage:
+    """
+    Binds the arguments of ``process_message`` for a storage consumer. This is
+    used instead of ``functools.partial`` since it is cheaper to pickle when
+    it has to be sent to the parallel transform worker processes.
+    """
+
+    __slots__ = ("processor", "consumer_group", "snuba_logical_topic", "validate")
+
+    def __init__(
+        self,
+        processor: MessageProcessor,
+        consumer_group: str,
+        snuba_logical_topic: SnubaTopic,
+        validate: bool,
+    ) -> None:
+        self.processor = processor
+        self.consumer_group = consumer_group
+        self.snuba_logical_topic = snuba_logical_topic
+        self.validate = validate
+
+    def __call__(
+        self, message: Message[KafkaPayload]
+    ) -> Union[None, BytesInsertBatch, ReplacementBatch]:
+        return process_message(
+            self.processor,
+            self.consumer_group,
+            self.snuba_logical_topic,
+            self.validate,
+            message,
+        )
+
+
 def _process_message_multistorage_work(
     metadata: KafkaMessageMetadata, storage_key: StorageKey, storage_message: Any
 ) -> Union[None, BytesInsertBatch, ReplacementBatch]:
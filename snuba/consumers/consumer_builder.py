@@ -1,22 +1,19 @@
 import functools
 import logging
 from dataclasses import dataclass
-from typing import Callable, Optional, Sequence
+from types import MappingProxyType
+from typing import Any, Callable, Mapping, MutableMapping, Optional, Sequence
 
 from arroyo import Topic
 from arroyo.backends.kafka import KafkaConsumer, KafkaPayload
-from arroyo.commit import IMMEDIATE
+from arroyo.commit import CommitPolicy
 from arroyo.processing import StreamProcessor
 from arroyo.processing.strategies import ProcessingStrategyFactory
 from arroyo.utils.profiler import ProcessingStrategyProfilerWrapperFactory
-from arroyo.utils.retries import BasicRetryPolicy, RetryPolicy
+from arroyo.utils.retries import RetryPolicy
 from confluent_kafka import KafkaError, KafkaException, Producer
 
-from snuba.consumers.consumer import (
-    CommitLogConfig,
-    build_batch_writer,
-    process_message,
-)
+from snuba.consumers.consumer import CommitLogConfig, ProcessMessage, build_batch_writer
 from snuba.consumers.strategy_factory import KafkaConsumerStrategyFactory
 from snuba.datasets.slicing import validate_passed_slice
 from snuba.datasets.storages.factory import get_writable_storage
@@ -29,9 +26,54 @@ from snuba.utils.streams.configuration_builder import (
     build_kafka_producer_configuration,
     get_default_kafka_configuration,
 )
+from snuba.utils.streams.retries import (
+    DroppingCommitRetryPolicy,
+    ExponentialBackoffRetryPolicy,
+)
+from snuba.utils.streams.types import KafkaBrokerConfig
 
 logger = logging.getLogger(__name__)
 
+# Batches flushed more often than this effectively commit every message.
+MIN_RECOMMENDED_BATCH_TIME_MS = 50
+
+# Producer settings for the replacements and commit log producer.
+# librdkafka sends every message in its own request by default, batch and
+# compress them instead. The batching settings can be overridden through
+# KafkaParameters.
+_PRODUCER_OVERRIDES: Mapping[str, Any] = MappingProxyType(
+    {
+        "partitioner": "consistent",
+        "message.max.bytes": 50000000,  # 50MB, default is 1MB
+        "compression.type": "lz4",
+        "linger.ms": 50,
+        "batch.num.messages": 10000,
+    }
+)
+
+# Commit errors caused by the group coordinator being temporarily
+# unavailable, which are retried and eventually dropped.
+_RETRYABLE_COMMIT_CODES = frozenset(
+    {
+        KafkaError.REQUEST_TIMED_OUT,
+        KafkaError.NOT_COORDINATOR,
+        KafkaError._WAIT_COORD,
+    }
+)
+
+
+def _is_retryable_commit_error(e: Exception) -> bool:
+    return isinstance(e, KafkaException) and e.args[0].code() in _RETRYABLE_COMMIT_CODES
+
+
+@functools.lru_cache(maxsize=None)
+def _topic(name: str) -> Topic:
+    """
+    Returns a shared ``Topic`` instance for each topic name, so the
+    builders of every slice reference the same objects.
+    """
+    return Topic(name)
+
 
 @dataclass(frozen=True)
 class KafkaParameters:
@@ -44,6 +86,30 @@ class KafkaParameters:
     strict_offset_reset: Optional[bool]
     queued_max_messages_kbytes: int
     queued_min_messages: int
+    fetch_min_bytes: Optional[int] = None
+    fetch_wait_max_ms: Optional[int] = None
+    fetch_message_max_bytes: Optional[int] = None
+    producer_compression_type: Optional[str] = None
+    producer_linger_ms: Optional[int] = None
+    producer_batch_num_messages: Optional[int] = None
+    cooperative_rebalance: bool = False
+
+    def __post_init__(self) -> None:
+        assert self.auto_offset_reset in (
+            "earliest",
+            "latest",
+            "error",
+        ), f"invalid auto offset reset: {self.auto_offset_reset}"
+        assert self.queued_max_messages_kbytes > 0
+        assert self.queued_min_messages > 0
+        for value in (
+            self.fetch_min_bytes,
+            self.fetch_wait_max_ms,
+            self.fetch_message_max_bytes,
+            self.producer_batch_num_messages,
+        ):
+            assert value is None or value > 0
+        assert self.producer_linger_ms is None or self.producer_linger_ms >= 0
 
 
 @dataclass(frozen=True)
@@ -52,6 +118,10 @@ class ProcessingParameters:
     input_block_size: Optional[int]
     output_block_size: Optional[int]
 
+    def __post_init__(self) -> None:
+        for value in (self.processes, self.input_block_size, self.output_block_size):
+            assert value is None or value > 0
+
 
 class ConsumerBuilder:
     """
@@ -73,50 +143,59 @@ class ConsumerBuilder:
         commit_retry_policy: Optional[RetryPolicy] = None,
         validate_schema: bool = False,
         profile_path: Optional[str] = None,
+        min_commit_frequency_sec: Optional[float] = None,
+        min_commit_messages: Optional[int] = None,
     ) -> None:
         self.storage = get_writable_storage(storage_key)
         self.bootstrap_servers = kafka_params.bootstrap_servers
         self.consumer_group = kafka_params.group_id
-        topic = (
-            self.storage.get_table_writer()
-            .get_stream_loader()
-            .get_default_topic_spec()
-            .topic
-        )
+        self.__table_writer = self.storage.get_table_writer()
+        self.__stream_loader = self.__table_writer.get_stream_loader()
+        # The default logical topic of the storage
+        self.__logical_topic = self.__stream_loader.get_default_topic_spec().topic
 
         # Ensure that the slice, storage set combination is valid
-        validate_passed_slice(self.storage.get_storage_set_key(), slice_id)
+        if slice_id is not None:
+            validate_passed_slice(self.storage.get_storage_set_key(), slice_id)
 
         self.broker_config = get_default_kafka_configuration(
-            topic, slice_id, bootstrap_servers=kafka_params.bootstrap_servers
-        )
-        logger.info(f"librdkafka log level: {self.broker_config.get('log_level', 6)}")
-        self.producer_broker_config = build_kafka_producer_configuration(
-            topic,
+            self.__logical_topic,
             slice_id,
             bootstrap_servers=kafka_params.bootstrap_servers,
-            override_params={
-                "partitioner": "consistent",
-                "message.max.bytes": 50000000,  # 50MB, default is 1MB
-            },
         )
-
-        stream_loader = self.storage.get_table_writer().get_stream_loader()
+        logger.info("librdkafka log level: %s", self.broker_config.get("log_level", 6))
+        self.__slice_id = slice_id
+        producer_overrides = {
+            key: value
+            for key, value in (
+                ("compression.type", kafka_params.producer_compression_type),
+                ("linger.ms", kafka_params.producer_linger_ms),
+                ("batch.num.messages", kafka_params.producer_batch_num_messages),
+            )
+            if value is not None
+        }
+        self.__producer_override_params: Mapping[str, Any] = (
+            {**_PRODUCER_OVERRIDES, **producer_overrides}
+            if producer_overrides
+            else _PRODUCER_OVERRIDES
+        )
 
         self.raw_topic: Topic
         if kafka_params.raw_topic is not None:
-            self.raw_topic = Topic(kafka_params.raw_topic)
+            self.raw_topic = _topic(kafka_params.raw_topic)
         else:
-            default_topic_spec = stream_loader.get_default_topic_spec()
-            self.raw_topic = Topic(default_topic_spec.get_physical_topic_name(slice_id))
+            default_topic_spec = self.__stream_loader.get_default_topic_spec()
+            self.raw_topic = _topic(
+                default_topic_spec.get_physical_topic_name(slice_id)
+            )
 
         self.replacements_topic: Optional[Topic]
         if kafka_params.replacements_topic is not None:
-            self.replacements_topic = Topic(kafka_params.replacements_topic)
+            self.replacements_topic = _topic(kafka_params.replacements_topic)
         else:
-            replacement_topic_spec = stream_loader.get_replacement_topic_spec()
+            replacement_topic_spec = self.__stream_loader.get_replacement_topic_spec()
             if replacement_topic_spec is not None:
-                self.replacements_topic = Topic(
+                self.replacements_topic = _topic(
                     replacement_topic_spec.get_physical_topic_name(slice_id)
                 )
             else:
@@ -124,68 +203,132 @@ class ConsumerBuilder:
 
         self.commit_log_topic: Optional[Topic]
         if kafka_params.commit_log_topic is not None:
-            self.commit_log_topic = Topic(kafka_params.commit_log_topic)
+            self.commit_log_topic = _topic(kafka_params.commit_log_topic)
 
         else:
-            commit_log_topic_spec = stream_loader.get_commit_log_topic_spec()
+            commit_log_topic_spec = self.__stream_loader.get_commit_log_topic_spec()
             if commit_log_topic_spec is not None:
-                self.commit_log_topic = Topic(
+                self.commit_log_topic = _topic(
                     commit_log_topic_spec.get_physical_topic_name(slice_id)
                 )
             else:
                 self.commit_log_topic = None
 
         self.stats_callback = stats_callback
-
-        # XXX: This can result in a producer being built in cases where it's
-        # not actually required.
-        self.producer = Producer(self.producer_broker_config)
+        # Collect metrics from librdkafka if we have stats_collection_freq_ms
+        # set for the consumer group, or use the default. This is read once
+        # rather than every time a consumer is built.
+        self.__stats_collection_frequency_ms = get_config(
+            f"stats_collection_freq_ms_{kafka_params.group_id}",
+            get_config("stats_collection_freq_ms", 0),
+        )
 
         self.metrics = metrics
-        self.max_batch_size = max_batch_size
-        self.max_batch_time_ms = max_batch_time_ms
         self.group_id = kafka_params.group_id
         self.auto_offset_reset = kafka_params.auto_offset_reset
         self.strict_offset_reset = kafka_params.strict_offset_reset
         self.queued_max_messages_kbytes = kafka_params.queued_max_messages_kbytes
         self.queued_min_messages = kafka_params.queued_min_messages
+        self.fetch_min_bytes = kafka_params.fetch_min_bytes
+        self.fetch_wait_max_ms = kafka_params.fetch_wait_max_ms
+        self.fetch_message_max_bytes = kafka_params.fetch_message_max_bytes
+        self.cooperative_rebalance = kafka_params.cooperative_rebalance
         self.processes = processing_params.processes
         self.input_block_size = processing_params.input_block_size
         self.output_block_size = processing_params.output_block_size
         self.__profile_path = profile_path
 
+        # If the application batch is much smaller than what librdkafka keeps
+        # in its local queue, messages sit in the queue while we commit many
+        # tiny batches. Keep the batch size in line with the queue sizing and
+        # never flush before the broker had a chance to fill a fetch.
+        self.max_batch_size = max(max_batch_size, self.queued_min_messages // 2)
+        self.max_batch_time_ms = max_batch_time_ms
+        if (
+            self.fetch_wait_max_ms is not None
+            and max_batch_time_ms < self.fetch_wait_max_ms
+        ):
+            logger.warning(
+                "max_batch_time_ms (%d) is lower than fetch.wait.max.ms (%d), "
+                "using the latter",
+                max_batch_time_ms,
+                self.fetch_wait_max_ms,
+            )
+            self.max_batch_time_ms = self.fetch_wait_max_ms
+        if self.max_batch_time_ms < MIN_RECOMMENDED_BATCH_TIME_MS:
+            logger.warning(
+                "max_batch_time_ms (%d) is very low, this will commit almost "
+                "every message and saturate the commit path",
+                self.max_batch_time_ms,
+            )
+        self.__max_batch_time_s = self.max_batch_time_ms / 1000.0
+        logger.info(
+            "Effective batch limits: max_batch_size=%d, max_batch_time_ms=%d",
+            self.max_batch_size,
+            self.max_batch_time_ms,
+        )
+
+        # Committing offsets as soon as the strategy asks for it saturates the
+        # group coordinator on high volume topics, so by default commit at
+        # most once per batch.
+        self.commit_policy = CommitPolicy(
+            min_commit_frequency_sec=(
+                min_commit_frequency_sec
+                if min_commit_frequency_sec is not None
+                else self.__max_batch_time_s
+            ),
+            min_commit_messages=(
+                min_commit_messages
+                if min_commit_messages is not None
+                else self.max_batch_size
+            ),
+        )
+
         if commit_retry_policy is None:
-            commit_retry_policy = BasicRetryPolicy(
-                3,
-                1,
-                lambda e: isinstance(e, KafkaException)
-                and e.args[0].code()
-                in (
-                    KafkaError.REQUEST_TIMED_OUT,
-                    KafkaError.NOT_COORDINATOR,
-                    KafkaError._WAIT_COORD,
+            # Retry quickly a couple of times (100ms, then 400ms) before
+            # dropping the commit so the consumer thread is not stalled while
+            # the coordinator is unavailable.
+            commit_retry_policy = DroppingCommitRetryPolicy(
+                _is_retryable_commit_error,
+                self.metrics,
+                retry_policy=ExponentialBackoffRetryPolicy(
+                    3,
+                    base_ms=100,
+                    cap_ms=1600,
+                    suppression_test=_is_retryable_commit_error,
                 ),
             )
 
         self.__commit_retry_policy = commit_retry_policy
         self.__validate_schema = validate_schema
+        self.__strategy_factories: MutableMapping[
+            Optional[int], ProcessingStrategyFactory[KafkaPayload]
+        ] = {}
+
+    @functools.cached_property
+    def producer_broker_config(self) -> KafkaBrokerConfig:
+        return build_kafka_producer_configuration(
+            self.__logical_topic,
+            self.__slice_id,
+            bootstrap_servers=self.bootstrap_servers,
+            override_params=self.__producer_override_params,
+        )
+
+    @functools.cached_property
+    def producer(self) -> Producer:
+        """
+        The producer used for replacements and the commit log. It is only
+        built the first time it is needed, since many consumers use neither.
+        """
+        return Producer(self.producer_broker_config)
 
     def __build_consumer(
         self,
         strategy_factory: ProcessingStrategyFactory[KafkaPayload],
         slice_id: Optional[int] = None,
     ) -> StreamProcessor[KafkaPayload]:
-
-        # retrieves the default logical topic
-        topic = (
-            self.storage.get_table_writer()
-            .get_stream_loader()
-            .get_default_topic_spec()
-            .topic
-        )
-
         configuration = build_kafka_consumer_configuration(
-            topic,
+            self.__logical_topic,
             bootstrap_servers=self.bootstrap_servers,
             group_id=self.group_id,
             slice_id=slice_id,
@@ -193,13 +336,32 @@ class ConsumerBuilder:
             strict_offset_reset=self.strict_offset_reset,
             queued_max_messages_kbytes=self.queued_max_messages_kbytes,
             queued_min_messages=self.queued_min_messages,
+            fetch_min_bytes=self.fetch_min_bytes,
+            fetch_wait_max_ms=self.fetch_wait_max_ms,
+            fetch_message_max_bytes=self.fetch_message_max_bytes,
         )
 
-        stats_collection_frequency_ms = get_config(
-            f"stats_collection_freq_ms_{self.group_id}",
-            get_config("stats_collection_freq_ms", 0),
-        )
+        # Record the effective local queue and fetch sizing, so it can be
+        # correlated with the librdkafka statistics when tuning the consumer.
+        for key in (
+            "queued.max.messages.kbytes",
+            "queued.min.messages",
+            "fetch.min.bytes",
+            "fetch.wait.max.ms",
+        ):
+            if configuration.get(key) is not None:
+                self.metrics.gauge(
+                    f"librdkafka.config.{key.replace('.', '_')}", configuration[key]
+                )
+
+        if self.cooperative_rebalance:
+            # Only the partitions that move between consumers are revoked
+            # during a rebalance, instead of stopping the whole group.
+            configuration.update(
+                {"partition.assignment.strategy": "cooperative-sticky"}
+            )
 
+        stats_collection_frequency_ms = self.__stats_collection_frequency_ms
         if stats_collection_frequency_ms and stats_collection_frequency_ms > 0:
             configuration.update(
                 {
@@ -213,17 +375,25 @@ class ConsumerBuilder:
             commit_retry_policy=self.__commit_retry_policy,
         )
 
-        return StreamProcessor(consumer, self.raw_topic, strategy_factory, IMMEDIATE)
+        return StreamProcessor(
+            consumer, self.raw_topic, strategy_factory, self.commit_policy
+        )
 
     def __build_streaming_strategy_factory(
         self,
         slice_id: Optional[int] = None,
     ) -> ProcessingStrategyFactory[KafkaPayload]:
-        table_writer = self.storage.get_table_writer()
-        stream_loader = table_writer.get_stream_loader()
-
-        logical_topic = stream_loader.get_default_topic_spec().topic
+        if slice_id not in self.__strategy_factories:
+            self.__strategy_factories[
+                slice_id
+            ] = self.__make_streaming_strategy_factory(slice_id)
+        return self.__strategy_factories[slice_id]
 
+    def __make_streaming_strategy_factory(
+        self,
+        slice_id: Optional[int] = None,
+    ) -> ProcessingStrategyFactory[KafkaPayload]:
+        stream_loader = self.__stream_loader
         processor = stream_loader.get_processor()
 
         if self.commit_log_topic:
@@ -237,15 +407,14 @@ class ConsumerBuilder:
             KafkaPayload
         ] = KafkaConsumerStrategyFactory(
             prefilter=stream_loader.get_pre_filter(),
-            process_message=functools.partial(
-                process_message,
+            process_message=ProcessMessage(
                 processor,
                 self.consumer_group,
-                logical_topic,
+                self.__logical_topic,
                 self.__validate_schema,
             ),
             collector=build_batch_writer(
-                table_writer,
+                self.__table_writer,
                 metrics=self.metrics,
                 replacements_producer=(
                     self.producer if self.replacements_topic is not None else None
@@ -255,7 +424,7 @@ class ConsumerBuilder:
                 commit_log_config=commit_log_config,
             ),
             max_batch_size=self.max_batch_size,
-            max_batch_time=self.max_batch_time_ms / 1000.0,
+            max_batch_time=self.__max_batch_time_s,
             processes=self.processes,
             input_block_size=self.input_block_size,
             output_block_size=self.output_block_size,
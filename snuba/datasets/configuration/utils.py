@@ -23,7 +23,9 @@ from snuba.datasets.plans.splitters import QuerySplitStrategy
 from snuba.query.processors.condition_checkers import ConditionChecker
 from snuba.query.processors.physical import ClickhouseQueryProcessor
 from snuba.utils.schemas import UUID, AggregateFunction, ColumnType, IPv4, IPv6
-from snuba.utils.streams.configuration_builder import build_kafka_producer_configuration
+from snuba.utils.streams.configuration_builder import (
+    build_dead_letter_queue_producer_configuration,
+)
 from snuba.utils.streams.topics import Topic
 
 
@@ -53,7 +55,9 @@ def generate_policy_creator(
 
         def produce_policy_creator() -> DeadLetterQueuePolicy:
             return ProduceInvalidMessagePolicy(
-                KafkaProducer(build_kafka_producer_configuration(Topic(dlq_topic))),
+                KafkaProducer(
+                    build_dead_letter_queue_producer_configuration(Topic(dlq_topic))
+                ),
                 KafkaTopic(dlq_topic),
             )
 
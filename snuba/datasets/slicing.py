@@ -51,8 +51,10 @@ def validate_passed_slice(storage_set: StorageSetKey, slice_id: Optional[int]) -
     and that the slice_id passed in is within the range
     of the total number of slices for the given storage set
     """
+    if slice_id is None:
+        return
+
     from snuba.settings import SLICED_STORAGE_SETS
 
-    if slice_id is not None:
-        assert storage_set.value in SLICED_STORAGE_SETS
-        assert slice_id < SLICED_STORAGE_SETS[storage_set.value]
+    assert storage_set.value in SLICED_STORAGE_SETS
+    assert slice_id < SLICED_STORAGE_SETS[storage_set.value]
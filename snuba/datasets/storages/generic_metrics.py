@@ -38,7 +38,9 @@ from snuba.query.processors.physical import ClickhouseQueryProcessor
 from snuba.query.processors.physical.table_rate_limit import TableRateLimit
 from snuba.query.processors.physical.tuple_unaliaser import TupleUnaliaser
 from snuba.subscriptions.utils import SchedulingWatermarkMode
-from snuba.utils.streams.configuration_builder import build_kafka_producer_configuration
+from snuba.utils.streams.configuration_builder import (
+    build_dead_letter_queue_producer_configuration,
+)
 from snuba.utils.streams.topics import Topic
 
 
@@ -48,7 +50,9 @@ def produce_policy_creator() -> DeadLetterQueuePolicy:
     """
     return ProduceInvalidMessagePolicy(
         KafkaProducer(
-            build_kafka_producer_configuration(Topic.DEAD_LETTER_GENERIC_METRICS)
+            build_dead_letter_queue_producer_configuration(
+                Topic.DEAD_LETTER_GENERIC_METRICS
+            )
         ),
         KafkaTopic(Topic.DEAD_LETTER_GENERIC_METRICS.value),
     )
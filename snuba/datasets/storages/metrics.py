@@ -40,7 +40,9 @@ from snuba.query.processors.physical.arrayjoin_keyvalue_optimizer import (
 )
 from snuba.query.processors.physical.table_rate_limit import TableRateLimit
 from snuba.subscriptions.utils import SchedulingWatermarkMode
-from snuba.utils.streams.configuration_builder import build_kafka_producer_configuration
+from snuba.utils.streams.configuration_builder import (
+    build_dead_letter_queue_producer_configuration,
+)
 from snuba.utils.streams.topics import Topic
 
 PRE_VALUE_COLUMNS: Sequence[Column[SchemaModifiers]] = [
@@ -64,7 +66,9 @@ def produce_policy_creator() -> DeadLetterQueuePolicy:
     Produce all bad messages to dead-letter topic.
     """
     return ProduceInvalidMessagePolicy(
-        KafkaProducer(build_kafka_producer_configuration(Topic.DEAD_LETTER_METRICS)),
+        KafkaProducer(
+            build_dead_letter_queue_producer_configuration(Topic.DEAD_LETTER_METRICS)
+        ),
         KafkaTopic(Topic.DEAD_LETTER_METRICS.value),
     )
 
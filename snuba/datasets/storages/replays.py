@@ -17,7 +17,9 @@ from snuba.datasets.table_storage import build_kafka_stream_loader_from_settings
 from snuba.query.processors.condition_checkers.checkers import ProjectIdEnforcer
 from snuba.query.processors.physical.table_rate_limit import TableRateLimit
 from snuba.utils.schemas import Nested
-from snuba.utils.streams.configuration_builder import build_kafka_producer_configuration
+from snuba.utils.streams.configuration_builder import (
+    build_dead_letter_queue_producer_configuration,
+)
 from snuba.utils.streams.topics import Topic
 
 LOCAL_TABLE_NAME = "replays_local"
@@ -90,7 +92,9 @@ schema = WritableTableSchema(
 def produce_policy_creator() -> DeadLetterQueuePolicy:
     """Produce all bad messages to dead-letter topic."""
     return ProduceInvalidMessagePolicy(
-        KafkaProducer(build_kafka_producer_configuration(Topic.DEAD_LETTER_REPLAYS)),
+        KafkaProducer(
+            build_dead_letter_queue_producer_configuration(Topic.DEAD_LETTER_REPLAYS)
+        ),
         KafkaTopic(Topic.DEAD_LETTER_REPLAYS.value),
     )
 
@@ -195,6 +195,11 @@ DEFAULT_MAX_BATCH_SIZE = 50000
 DEFAULT_MAX_BATCH_TIME_MS = 2 * 1000
 DEFAULT_QUEUED_MAX_MESSAGE_KBYTES = 10000
 DEFAULT_QUEUED_MIN_MESSAGES = 10000
+# Broker fetch sizing for the consumers. librdkafka defaults to returning as
+# soon as a single byte is available, which results in many small fetches on
+# busy topics.
+DEFAULT_FETCH_MIN_BYTES = 1024 * 1024
+DEFAULT_FETCH_WAIT_MAX_MS = 500
 DISCARD_OLD_EVENTS = True
 CLICKHOUSE_HTTP_CHUNK_SIZE = 8192
 HTTP_WRITER_BUFFER_SIZE = 1
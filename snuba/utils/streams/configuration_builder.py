@@ -1,3 +1,4 @@
+from types import MappingProxyType
 from typing import Any, Mapping, Optional, Sequence
 
 from arroyo.backends.kafka import build_kafka_configuration
@@ -48,10 +49,13 @@ def build_kafka_consumer_configuration(
     bootstrap_servers: Optional[Sequence[str]] = None,
     override_params: Optional[Mapping[str, Any]] = None,
     strict_offset_reset: Optional[bool] = None,
+    fetch_min_bytes: Optional[int] = None,
+    fetch_wait_max_ms: Optional[int] = None,
+    fetch_message_max_bytes: Optional[int] = None,
 ) -> KafkaBrokerConfig:
     default_topic_config = _get_default_topic_configuration(topic, slice_id)
 
-    return _build_kafka_consumer_configuration(
+    broker_config = _build_kafka_consumer_configuration(
         default_topic_config,
         group_id,
         auto_offset_reset,
@@ -62,6 +66,18 @@ def build_kafka_consumer_configuration(
         strict_offset_reset,
     )
 
+    # Only override the librdkafka defaults for the fetch settings that were
+    # explicitly provided.
+    for key, value in (
+        ("fetch.min.bytes", fetch_min_bytes),
+        ("fetch.wait.max.ms", fetch_wait_max_ms),
+        ("fetch.message.max.bytes", fetch_message_max_bytes),
+    ):
+        if value is not None:
+            broker_config[key] = value
+
+    return broker_config
+
 
 def build_kafka_producer_configuration(
     topic: Optional[Topic],
@@ -78,5 +94,22 @@ def build_kafka_producer_configuration(
     return broker_config
 
 
+# Dead letter queue producers are separate from the replacements and commit
+# log producer, and tuned for bursts of invalid messages rather than latency.
+DEAD_LETTER_QUEUE_PRODUCER_OVERRIDES: Mapping[str, Any] = MappingProxyType(
+    {
+        "compression.type": "lz4",
+        "linger.ms": 100,
+        "batch.num.messages": 10000,
+    }
+)
+
+
+def build_dead_letter_queue_producer_configuration(topic: Topic) -> KafkaBrokerConfig:
+    return build_kafka_producer_configuration(
+        topic, override_params=DEAD_LETTER_QUEUE_PRODUCER_OVERRIDES
+    )
+
+
 def build_default_kafka_producer_configuration() -> KafkaBrokerConfig:
     return build_kafka_producer_configuration(None, None)
@@ -0,0 +1,114 @@
+import logging
+import random
+from typing import Callable, Optional, TypeVar, cast
+
+from arroyo.utils.clock import Clock, SystemClock
+from arroyo.utils.retries import NoRetryPolicy, RetryException, RetryPolicy
+
+from snuba.utils.metrics import MetricsBackend
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class ExponentialBackoffRetryPolicy(RetryPolicy):
+    """
+    Attempts to invoke the provided callable up to ``max_attempts`` times,
+    waiting ``base_ms * 4 ** (attempt - 1)`` milliseconds (capped at
+    ``cap_ms``) between attempts. With ``jitter`` enabled the delay is
+    randomized between half and the full backoff so that consumers failing at
+    the same time do not retry in lockstep.
+
+    Like arroyo's ``BasicRetryPolicy``, only exceptions that pass the
+    suppression test are retried, and a ``RetryException`` is raised once all
+    attempts have been exhausted.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int,
+        base_ms: float,
+        cap_ms: float,
+        suppression_test: Optional[Callable[[Exception], bool]] = None,
+        jitter: bool = True,
+        clock: Clock = SystemClock(),
+    ) -> None:
+        self.__max_attempts = max_attempts
+        self.__base_ms = base_ms
+        self.__cap_ms = cap_ms
+        self.__suppression_test = suppression_test
+        self.__jitter = jitter
+        self.__clock = clock
+
+    def get_delay_ms(self, attempt: int) -> float:
+        delay_ms = min(self.__cap_ms, self.__base_ms * 4 ** (attempt - 1))
+        if self.__jitter:
+            delay_ms = random.uniform(delay_ms / 2, delay_ms)
+        return delay_ms
+
+    def call(self, callable: Callable[[], T]) -> T:
+        for i in range(1, self.__max_attempts + 1):
+            try:
+                return callable()
+            except Exception as exception:
+                if self.__suppression_test is not None and not self.__suppression_test(
+                    exception
+                ):
+                    raise
+
+                if i == self.__max_attempts:
+                    raise RetryException() from exception
+
+            self.__clock.sleep(self.get_delay_ms(i) / 1000.0)
+
+        raise Exception("unexpected fallthrough")
+
+
+class DroppingCommitRetryPolicy(RetryPolicy):
+    """
+    A retry policy for consumer commits that never blocks the consumer
+    thread for long. The commit is invoked through ``retry_policy`` (no
+    retries by default); if it still fails with an error that passes the
+    suppression test, the failure is logged and counted, and the commit is
+    dropped.
+
+    This is safe because offsets that fail to be committed remain staged on
+    the consumer, so they are included in the next commit that is attempted
+    for the following batch.
+    """
+
+    def __init__(
+        self,
+        suppression_test: Callable[[Exception], bool],
+        metrics: MetricsBackend,
+        retry_policy: Optional[RetryPolicy] = None,
+    ) -> None:
+        self.__suppression_test = suppression_test
+        self.__metrics = metrics
+        self.__retry_policy = (
+            retry_policy if retry_policy is not None else NoRetryPolicy()
+        )
+
+    def __should_drop(self, exception: Exception) -> bool:
+        if isinstance(exception, RetryException) and isinstance(
+            exception.__cause__, Exception
+        ):
+            exception = exception.__cause__
+        return self.__suppression_test(exception)
+
+    def call(self, callable: Callable[[], T]) -> T:
+        try:
+            return self.__retry_policy.call(callable)
+        except Exception as exception:
+            if not self.__should_drop(exception):
+                raise
+
+            logger.warning(
+                "Dropping failed commit, offsets will be committed with the next batch",
+                exc_info=True,
+            )
+            self.__metrics.increment("commit_dropped")
+            # ``commit_offsets`` returns the mapping of offsets that were
+            # committed, and nothing was.
+            return cast(T, {})
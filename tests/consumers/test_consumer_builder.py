@@ -1,16 +1,22 @@
 import pytest
 from arroyo import Topic
-from confluent_kafka import Producer
+from confluent_kafka import KafkaError, KafkaException, Producer
 
 from snuba import environment
 from snuba.consumers.consumer_builder import (
     ConsumerBuilder,
     KafkaParameters,
     ProcessingParameters,
+    _is_retryable_commit_error,
 )
 from snuba.datasets.storages.factory import get_writable_storage
 from snuba.datasets.storages.storage_key import StorageKey
 from snuba.utils.metrics.backends.abstract import MetricsBackend
+from snuba.utils.metrics.backends.testing import (
+    TestingMetricsBackend,
+    clear_recorded_metric_calls,
+    get_recorded_metric_calls,
+)
 from snuba.utils.metrics.wrapper import MetricsWrapper
 
 test_storage_key = StorageKey("errors")
@@ -151,3 +157,238 @@ def test_optional_kafka_overrides() -> None:
             consumer_builder_with_opt.commit_log_topic.name
             == optional_kafka_params.commit_log_topic
         ), "Commit log topic name should match commit log Kafka topic override"
+
+
+def test_batch_limits_follow_queue_sizing() -> None:
+    con_build = ConsumerBuilder(
+        storage_key=test_storage_key,
+        kafka_params=KafkaParameters(
+            raw_topic=None,
+            replacements_topic=None,
+            bootstrap_servers=None,
+            group_id=consumer_group_name,
+            commit_log_topic=None,
+            auto_offset_reset="earliest",
+            strict_offset_reset=None,
+            queued_max_messages_kbytes=1,
+            queued_min_messages=10000,
+            fetch_wait_max_ms=500,
+        ),
+        processing_params=ProcessingParameters(
+            processes=None,
+            input_block_size=None,
+            output_block_size=None,
+        ),
+        max_batch_size=3,
+        max_batch_time_ms=4,
+        metrics=MetricsWrapper(
+            environment.metrics,
+            "test_consumer",
+            tags={"group": consumer_group_name, "storage": test_storage_key.value},
+        ),
+        slice_id=None,
+    )
+
+    assert con_build.max_batch_size == 5000
+    assert con_build.max_batch_time_ms == 500
+
+
+def test_producer_is_built_lazily() -> None:
+    con_build = ConsumerBuilder(
+        storage_key=test_storage_key,
+        kafka_params=optional_kafka_params,
+        processing_params=ProcessingParameters(
+            processes=None,
+            input_block_size=None,
+            output_block_size=None,
+        ),
+        max_batch_size=3,
+        max_batch_time_ms=4,
+        metrics=MetricsWrapper(
+            environment.metrics,
+            "test_consumer",
+            tags={"group": consumer_group_name, "storage": test_storage_key.value},
+        ),
+        slice_id=None,
+    )
+
+    assert "producer" not in vars(con_build)
+    assert isinstance(con_build.producer, Producer)
+    assert con_build.producer is con_build.producer
+
+
+def test_producer_batching_configuration() -> None:
+    assert consumer_builder.producer_broker_config["compression.type"] == "lz4"
+    assert consumer_builder.producer_broker_config["linger.ms"] == 50
+    assert consumer_builder.producer_broker_config["batch.num.messages"] == 10000
+
+
+def test_strategy_factory_is_reused_per_slice() -> None:
+    build_strategy_factory = (
+        consumer_builder._ConsumerBuilder__build_streaming_strategy_factory  # type: ignore
+    )
+    strategy_factory = build_strategy_factory(None)
+    assert build_strategy_factory(None) is strategy_factory
+
+
+def test_invalid_parameters() -> None:
+    with pytest.raises(AssertionError):
+        KafkaParameters(
+            raw_topic=None,
+            replacements_topic=None,
+            bootstrap_servers=None,
+            group_id=consumer_group_name,
+            commit_log_topic=None,
+            auto_offset_reset="smallest",
+            strict_offset_reset=None,
+            queued_max_messages_kbytes=1,
+            queued_min_messages=2,
+        )
+
+    with pytest.raises(AssertionError):
+        KafkaParameters(
+            raw_topic=None,
+            replacements_topic=None,
+            bootstrap_servers=None,
+            group_id=consumer_group_name,
+            commit_log_topic=None,
+            auto_offset_reset="earliest",
+            strict_offset_reset=None,
+            queued_max_messages_kbytes=0,
+            queued_min_messages=2,
+        )
+
+    with pytest.raises(AssertionError):
+        ProcessingParameters(processes=0, input_block_size=None, output_block_size=None)
+
+
+def test_default_commit_policy() -> None:
+    assert consumer_builder.commit_policy.min_commit_frequency_sec == pytest.approx(
+        consumer_builder.max_batch_time_ms / 1000.0
+    )
+    assert (
+        consumer_builder.commit_policy.min_commit_messages
+        == consumer_builder.max_batch_size
+    )
+
+
+def test_retryable_commit_errors() -> None:
+    assert _is_retryable_commit_error(
+        KafkaException(KafkaError(KafkaError.NOT_COORDINATOR))
+    )
+    assert not _is_retryable_commit_error(
+        KafkaException(KafkaError(KafkaError.UNKNOWN_MEMBER_ID))
+    )
+    assert not _is_retryable_commit_error(ValueError())
+
+
+def test_no_producer_without_replacements_or_commit_log() -> None:
+    # The querylog storage has neither a replacements nor a commit log topic,
+    # so building its strategy factory should never create a producer.
+    storage_key = StorageKey("querylog")
+    con_build = ConsumerBuilder(
+        storage_key=storage_key,
+        kafka_params=KafkaParameters(
+            raw_topic=None,
+            replacements_topic=None,
+            bootstrap_servers=None,
+            group_id=consumer_group_name,
+            commit_log_topic=None,
+            auto_offset_reset="earliest",
+            strict_offset_reset=None,
+            queued_max_messages_kbytes=1,
+            queued_min_messages=2,
+        ),
+        processing_params=ProcessingParameters(
+            processes=None,
+            input_block_size=None,
+            output_block_size=None,
+        ),
+        max_batch_size=3,
+        max_batch_time_ms=4,
+        metrics=MetricsWrapper(
+            environment.metrics,
+            "test_consumer",
+            tags={"group": consumer_group_name, "storage": storage_key.value},
+        ),
+        slice_id=None,
+    )
+
+    assert con_build.replacements_topic is None
+    assert con_build.commit_log_topic is None
+    con_build._ConsumerBuilder__build_streaming_strategy_factory(None)  # type: ignore
+    assert "producer" not in vars(con_build)
+    assert "producer_broker_config" not in vars(con_build)
+
+
+def test_consumer_config_metrics() -> None:
+    clear_recorded_metric_calls()
+    con_build = ConsumerBuilder(
+        storage_key=StorageKey("querylog"),
+        kafka_params=KafkaParameters(
+            raw_topic=None,
+            replacements_topic=None,
+            bootstrap_servers=None,
+            group_id=consumer_group_name,
+            commit_log_topic=None,
+            auto_offset_reset="earliest",
+            strict_offset_reset=None,
+            queued_max_messages_kbytes=1,
+            queued_min_messages=2,
+            fetch_wait_max_ms=500,
+        ),
+        processing_params=ProcessingParameters(
+            processes=None,
+            input_block_size=None,
+            output_block_size=None,
+        ),
+        max_batch_size=3,
+        max_batch_time_ms=4,
+        metrics=TestingMetricsBackend(),
+        slice_id=None,
+    )
+
+    con_build.build_base_consumer()
+
+    for name, value in (
+        ("librdkafka.config.queued_max_messages_kbytes", 1),
+        ("librdkafka.config.queued_min_messages", 2),
+        ("librdkafka.config.fetch_wait_max_ms", 500),
+    ):
+        recorded = get_recorded_metric_calls("gauge", name)
+        assert recorded is not None
+        assert recorded[-1].value == value
+    assert (
+        get_recorded_metric_calls("gauge", "librdkafka.config.fetch_min_bytes") is None
+    )
+
+
+def test_producer_configuration_overrides() -> None:
+    con_build = ConsumerBuilder(
+        storage_key=test_storage_key,
+        kafka_params=KafkaParameters(
+            raw_topic=None,
+            replacements_topic=None,
+            bootstrap_servers=None,
+            group_id=consumer_group_name,
+            commit_log_topic=None,
+            auto_offset_reset="earliest",
+            strict_offset_reset=None,
+            queued_max_messages_kbytes=1,
+            queued_min_messages=2,
+            producer_linger_ms=0,
+        ),
+        processing_params=ProcessingParameters(
+            processes=None,
+            input_block_size=None,
+            output_block_size=None,
+        ),
+        max_batch_size=3,
+        max_batch_time_ms=4,
+        metrics=TestingMetricsBackend(),
+        slice_id=None,
+    )
+
+    assert con_build.producer_broker_config["linger.ms"] == 0
+    assert con_build.producer_broker_config["compression.type"] == "lz4"
+    assert con_build.producer_broker_config["partitioner"] == "consistent"
@@ -17,12 +17,15 @@ from snuba.consumers.consumer import (
     InsertBatchWriter,
     MultistorageConsumerProcessingStrategyFactory,
     ProcessedMessageBatchWriter,
+    ProcessMessage,
     ReplacementBatchWriter,
     process_message,
 )
 from snuba.consumers.strategy_factory import KafkaConsumerStrategyFactory
 from snuba.datasets.schemas.tables import TableSchema
 from snuba.datasets.storage import Storage
+from snuba.datasets.storages.factory import get_writable_storage
+from snuba.datasets.storages.storage_key import StorageKey
 from snuba.processor import InsertBatch, ReplacementBatch
 from snuba.utils.metrics.wrapper import MetricsWrapper
 from snuba.utils.streams.topics import Topic as SnubaTopic
@@ -116,6 +119,22 @@ def test_streaming_consumer_strategy() -> None:
         strategy.join()
 
 
+def test_process_message_pickle() -> None:
+    processor = (
+        get_writable_storage(StorageKey.ERRORS)
+        .get_table_writer()
+        .get_stream_loader()
+        .get_processor()
+    )
+    function = ProcessMessage(processor, "consumer_group", SnubaTopic.EVENTS, False)
+
+    unpickled = pickle.loads(pickle.dumps(function))
+    assert isinstance(unpickled.processor, type(processor))
+    assert unpickled.consumer_group == "consumer_group"
+    assert unpickled.snuba_logical_topic == SnubaTopic.EVENTS
+    assert unpickled.validate is False
+
+
 def test_json_row_batch_pickle_simple() -> None:
     batch = BytesInsertBatch([b"foo", b"bar", b"baz"], datetime(2021, 1, 1, 11, 0, 1))
     assert pickle.loads(pickle.dumps(batch)) == batch
@@ -2,7 +2,10 @@ import importlib
 
 from snuba import settings
 from snuba.utils.streams.configuration_builder import (
+    DEAD_LETTER_QUEUE_PRODUCER_OVERRIDES,
     _get_default_topic_configuration,
+    build_dead_letter_queue_producer_configuration,
+    build_kafka_consumer_configuration,
     get_default_kafka_configuration,
 )
 from snuba.utils.streams.topics import Topic
@@ -87,3 +90,24 @@ def test_get_default_topic_configuration() -> None:
 
     default_config = _get_default_topic_configuration(None)
     assert default_config["bootstrap.servers"] == default_broker
+
+
+def test_consumer_config_fetch_parameters() -> None:
+    consumer_config = build_kafka_consumer_configuration(
+        Topic.EVENTS,
+        "my_consumer_group",
+        fetch_min_bytes=1024,
+        fetch_wait_max_ms=500,
+    )
+    assert consumer_config["fetch.min.bytes"] == 1024
+    assert consumer_config["fetch.wait.max.ms"] == 500
+    # Unset parameters fall back to the librdkafka defaults
+    assert "fetch.message.max.bytes" not in consumer_config
+
+
+def test_dead_letter_queue_producer_config() -> None:
+    producer_config = build_dead_letter_queue_producer_configuration(
+        Topic.DEAD_LETTER_METRICS
+    )
+    for key, value in DEAD_LETTER_QUEUE_PRODUCER_OVERRIDES.items():
+        assert producer_config[key] == value
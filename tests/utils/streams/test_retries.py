@@ -0,0 +1,102 @@
+from typing import Mapping
+
+import pytest
+from arroyo.utils.clock import TestingClock
+from arroyo.utils.retries import RetryException
+
+from snuba.utils.metrics.backends.testing import (
+    TestingMetricsBackend,
+    clear_recorded_metric_calls,
+    get_recorded_metric_calls,
+)
+from snuba.utils.streams.retries import (
+    DroppingCommitRetryPolicy,
+    ExponentialBackoffRetryPolicy,
+)
+
+
+class RetryableError(Exception):
+    pass
+
+
+def test_dropping_commit_retry_policy() -> None:
+    clear_recorded_metric_calls()
+    policy = DroppingCommitRetryPolicy(
+        lambda e: isinstance(e, RetryableError), TestingMetricsBackend()
+    )
+
+    assert policy.call(lambda: {"partition": 1}) == {"partition": 1}
+    assert get_recorded_metric_calls("increment", "commit_dropped") is None
+
+    calls = 0
+
+    def failing_commit() -> Mapping[str, int]:
+        nonlocal calls
+        calls += 1
+        raise RetryableError()
+
+    assert policy.call(failing_commit) == {}
+    assert calls == 1
+    recorded = get_recorded_metric_calls("increment", "commit_dropped")
+    assert recorded is not None and len(recorded) == 1
+
+    def fatal_commit() -> Mapping[str, int]:
+        raise ValueError()
+
+    with pytest.raises(ValueError):
+        policy.call(fatal_commit)
+
+
+def test_exponential_backoff_retry_policy() -> None:
+    clock = TestingClock()
+    policy = ExponentialBackoffRetryPolicy(
+        3,
+        base_ms=100,
+        cap_ms=300,
+        suppression_test=lambda e: isinstance(e, RetryableError),
+        jitter=False,
+        clock=clock,
+    )
+
+    def failing_commit() -> Mapping[str, int]:
+        raise RetryableError()
+
+    with pytest.raises(RetryException):
+        policy.call(failing_commit)
+
+    # Slept 100ms after the first attempt and the capped 300ms after the second
+    assert clock.time() == pytest.approx(0.4)
+
+    attempts = 0
+
+    def flaky_commit() -> Mapping[str, int]:
+        nonlocal attempts
+        attempts += 1
+        if attempts < 2:
+            raise RetryableError()
+        return {"partition": 1}
+
+    assert policy.call(flaky_commit) == {"partition": 1}
+    assert attempts == 2
+
+
+def test_dropping_commit_retry_policy_with_backoff() -> None:
+    clear_recorded_metric_calls()
+    policy = DroppingCommitRetryPolicy(
+        lambda e: isinstance(e, RetryableError),
+        TestingMetricsBackend(),
+        retry_policy=ExponentialBackoffRetryPolicy(
+            2,
+            base_ms=100,
+            cap_ms=100,
+            suppression_test=lambda e: isinstance(e, RetryableError),
+            clock=TestingClock(),
+        ),
+    )
+
+    def failing_commit() -> Mapping[str, int]:
+        raise RetryableError()
+
+    assert policy.call(failing_commit) == {}
+    recorded = get_recorded_metric_calls("increment", "commit_dropped")
+    assert recorded is not None and len(recorded) == 1